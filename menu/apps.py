@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class MenuConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'menu'
\ No newline at end of file
+    name = 'menu'
+
+    def ready(self):
+        # Подключение обработчиков, сбрасывающих версии скомпилированных меню
+        from . import signals  # noqa: F401
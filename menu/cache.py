@@ -0,0 +1,504 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .models import Menu, MenuItem
+
+
+VERSION_KEY = 'menu:version:{name}'
+CHANGED_KEY = 'menu:changed:{name}'
+COMPILED_KEY = 'menu:compiled:{name}:{version}'
+LOCK_KEY = 'menu:lock:{name}'
+DELTA_KEY = 'menu:delta:{name}:{version}'
+
+# Значения по умолчанию для настроек MENU_* из settings.py
+DEFAULT_CACHE_ALIAS = 'default'
+DEFAULT_MAX_STALENESS = 30
+DEFAULT_CLUSTER_LOCK = False
+DEFAULT_LOCK_TIMEOUT = 10
+DEFAULT_COMPILED_TIMEOUT = 60 * 60 * 24
+DEFAULT_MAX_DELTAS = 100
+DEFAULT_DELTA_TIMEOUT = 60 * 60
+# Время жизни скомпилированного меню, если кэш не общий для процессов (LocMemCache):
+# изменения, сделанные другим процессом, станут видны не позже чем через это время
+DEFAULT_LOCAL_COMPILED_TTL = 5
+LOCK_POLL_INTERVAL = 0.05
+
+# Ограничения на размер кэшей внутри скомпилированного меню
+ACTIVE_PATHS_LIMIT = 10000
+VARIANTS_LIMIT = 1000
+
+
+def get_setting(name, default):
+    """Возвращает настройку MENU_<name> из settings.py или значение по умолчанию."""
+    return getattr(settings, f'MENU_{name}', default)
+
+
+def get_cache():
+    """Возвращает бэкенд кэша, в котором хранятся версии и скомпилированные меню."""
+    return caches[get_setting('CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+
+def get_compiled_ttl():
+    """
+    Возвращает время жизни скомпилированного меню в процессе или None (без ограничения).
+    Для кэша внутри процесса версии не видны другим процессам, поэтому меню
+    периодически перечитывается из БД.
+    """
+    default = None
+    if isinstance(get_cache(), (LocMemCache, DummyCache)):
+        default = DEFAULT_LOCAL_COMPILED_TTL
+    return get_setting('COMPILED_TTL', default)
+
+
+def _new_version_base():
+    """
+    Возвращает случайное начало последовательности версий.
+    После очистки кэша последовательность начинается заново с другого числа,
+    поэтому процессы не примут устаревшее меню за актуальное.
+    """
+    return random.randrange(1, 1 << 40) << 20
+
+
+def get_menu_version(menu_name):
+    """Возвращает текущую версию содержимого меню или None, если кэш недоступен."""
+    return get_menu_state(menu_name)[0]
+
+
+def get_menu_state(menu_name):
+    """
+    Возвращает (версия, время изменения) меню одним обращением к кэшу.
+    Время изменения - time.time() последнего изменения или None, если оно неизвестно.
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(name=menu_name)
+    changed_key = CHANGED_KEY.format(name=menu_name)
+    values = cache.get_many([key, changed_key])
+    version = values.get(key)
+    if version is None:
+        cache.add(key, _new_version_base(), timeout=None)
+        version = cache.get(key)
+    return version, values.get(changed_key)
+
+
+def bump_menu_version(menu_name, delta=None):
+    """
+    Помечает все скомпилированные копии меню как устаревшие.
+    Версии увеличиваются атомарно, поэтому изменения (delta) применяются процессами
+    строго по порядку. Без delta процессы перестраивают меню целиком.
+    """
+    cache = get_cache()
+    key = VERSION_KEY.format(name=menu_name)
+    cache.set(CHANGED_KEY.format(name=menu_name), time.time(), timeout=None)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        cache.add(key, _new_version_base(), timeout=None)
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            return None
+
+    if delta is not None:
+        store_menu_delta(menu_name, version, delta)
+    return version
+
+
+def store_menu_delta(menu_name, version, delta):
+    """Сохраняет изменение, переводящее меню из версии version - 1 в version."""
+    get_cache().set(
+        DELTA_KEY.format(name=menu_name, version=version),
+        delta,
+        timeout=get_setting('DELTA_TIMEOUT', DEFAULT_DELTA_TIMEOUT)
+    )
+
+
+def item_delta(item):
+    """Изменение "пункт добавлен или изменен" со всеми полями пункта."""
+    return {
+        'op': 'save',
+        'fields': {field.attname: getattr(item, field.attname) for field in item._meta.concrete_fields},
+    }
+
+
+def item_removed_delta(item):
+    """Изменение "пункт удален"."""
+    return {'op': 'delete', 'id': item.pk}
+
+
+class CompiledMenu:
+    """
+    Скомпилированное меню: пункты, отображение детей, индекс URL,
+    кэш отрисованных вариантов и версия содержимого.
+    """
+
+    def __init__(self, menu, items, version):
+        self.menu = menu
+        self.version = version
+        self.items_by_id = {item.id: item for item in items}
+        self.children = {}
+        self.built_at = time.monotonic()
+        # Увеличивается перед каждым изменением; отрисовка, начатая до изменения,
+        # не сохраняет свой вариант
+        self.generation = 0
+
+        # Индекс URL пунктов (id -> URL), заполняется по мере обращения
+        self.urls = {}
+        # Путь страницы -> id активного пункта
+        self.active_by_path = {}
+        # Ключ варианта (активный пункт и параметры отрисовки) -> (HTML, множество id отрисованных пунктов)
+        self.variants = {}
+        # named_url -> пункт, строится при первом поиске
+        self.named_index = None
+
+        for item in items:
+            self.children.setdefault(item.parent_id, []).append(item)
+
+        # Сортировка детей по порядку и заголовку
+        for children in self.children.values():
+            children.sort(key=lambda x: (x.order, x.title))
+
+    @property
+    def items(self):
+        """Список всех пунктов (копия - для отрисовки используйте items_by_id)."""
+        return list(self.items_by_id.values())
+
+    def get_url(self, item):
+        """Возвращает URL пункта из индекса, вычисляя его при первом обращении."""
+        url = self.urls.get(item.id)
+        if url is None:
+            url = self.urls[item.id] = item.get_url()
+        return url
+
+    def find_active_id(self, current_url):
+        """Возвращает id наиболее специфичного активного пункта (с самым длинным URL)."""
+        try:
+            return self.active_by_path[current_url]
+        except KeyError:
+            pass
+
+        active_id = None
+        active_length = -1
+        for item in self.items_by_id.values():
+            url = self.get_url(item)
+            if len(url) > active_length and item.is_active(current_url, url):
+                active_id = item.id
+                active_length = len(url)
+
+        if len(self.active_by_path) >= ACTIVE_PATHS_LIMIT:
+            self.active_by_path.clear()
+        self.active_by_path[current_url] = active_id
+        return active_id
+
+    def find_item(self, value):
+        """Находит пункт по объекту MenuItem, id или named_url."""
+        if isinstance(value, MenuItem):
+            return self.items_by_id.get(value.id)
+        if isinstance(value, int) or isinstance(value, str) and value.isdigit():
+            return self.items_by_id.get(int(value))
+
+        named_index = self.named_index
+        if named_index is None:
+            named_index = {}
+            for item in self.items_by_id.values():
+                if item.named_url:
+                    named_index.setdefault(item.named_url, item)
+            self.named_index = named_index
+        return named_index.get(value)
+
+    def get_variant(self, key):
+        """Возвращает отрисованный HTML для ключа варианта или None."""
+        variant = self.variants.get(key)
+        return variant[0] if variant is not None else None
+
+    def set_variant(self, key, html, visible_ids, generation):
+        """
+        Сохраняет отрисованный вариант, если меню не изменялось с момента generation,
+        когда отрисовка начала читать меню.
+        """
+        if generation != self.generation:
+            return
+        if len(self.variants) >= VARIANTS_LIMIT:
+            self.variants.clear()
+        self.variants[key] = (html, frozenset(visible_ids))
+
+    def apply_delta(self, delta):
+        """
+        Применяет изменение одного пункта к скомпилированному меню.
+        Возвращает False, если изменение нельзя применить и меню нужно перестроить.
+        """
+        self.generation += 1
+        if delta['op'] == 'delete':
+            return self._remove_item(delta['id'])
+
+        fields = delta['fields']
+        if fields['menu_id'] != self.menu.id:
+            # Пункт перенесен в другое меню
+            return self._remove_item(fields['id'])
+
+        parent_id = fields['parent_id']
+        if parent_id is not None and parent_id not in self.items_by_id:
+            return False
+
+        old = self.items_by_id.get(fields['id'])
+        if old is not None and all(getattr(old, name) == value for name, value in fields.items()):
+            return True
+
+        item = MenuItem(**fields)
+        item.menu = self.menu
+        if parent_id is not None:
+            item.parent = self.items_by_id[parent_id]
+
+        # Родители затронуты, только если у них меняется набор детей
+        affected = {item.id}
+        if old is None or old.parent_id != parent_id:
+            affected.add(parent_id)
+        if old is not None:
+            if old.parent_id != parent_id:
+                # У потомков пункта меняются предки, а они могут быть не отрисованы
+                # в варианте (max_depth, root), хотя влияют на раскрытие веток.
+                # Переносы редки, поэтому сбрасываются все варианты
+                affected.add(None)
+            self._set_children(old.parent_id, [c for c in self.children.get(old.parent_id, []) if c.id != item.id])
+            self.items_by_id[item.id] = item
+        else:
+            # Словарь заменяется копией, чтобы не менять размер словаря, который сейчас обходится
+            self.items_by_id = {**self.items_by_id, item.id: item}
+        self._set_children(
+            parent_id,
+            sorted(
+                [c for c in self.children.get(parent_id, []) if c.id != item.id] + [item],
+                key=lambda x: (x.order, x.title)
+            )
+        )
+
+        if old is None or (old.named_url, old.explicit_url) != (item.named_url, item.explicit_url):
+            self.urls.pop(item.id, None)
+            self.active_by_path.clear()
+            self.named_index = None
+
+        self._invalidate_variants(affected)
+        return True
+
+    def _remove_item(self, item_id):
+        old = self.items_by_id.get(item_id)
+        if old is None:
+            return True
+
+        items_by_id = dict(self.items_by_id)
+        del items_by_id[item_id]
+        self.items_by_id = items_by_id
+
+        self._set_children(old.parent_id, [c for c in self.children.get(old.parent_id, []) if c.id != item_id])
+        self.children.pop(item_id, None)
+        self.urls.pop(item_id, None)
+        self.active_by_path.clear()
+        self.named_index = None
+        self._invalidate_variants({item_id, old.parent_id})
+        return True
+
+    def _set_children(self, parent_id, children):
+        # Списки детей заменяются целиком, чтобы не менять список, который сейчас отрисовывается
+        if children:
+            self.children[parent_id] = children
+        else:
+            self.children.pop(parent_id, None)
+
+    def _invalidate_variants(self, affected_ids):
+        """Удаляет варианты, в которых отрисован хотя бы один из затронутых пунктов."""
+        if None in affected_ids:
+            # Изменились корневые элементы - они есть во всех вариантах
+            self.variants.clear()
+            return
+        for key, (_, visible_ids) in list(self.variants.items()):
+            if not visible_ids.isdisjoint(affected_ids):
+                self.variants.pop(key, None)
+
+
+class MenuStore:
+    """
+    Хранилище скомпилированных меню внутри процесса.
+
+    Перестроение меню выполняется в одном потоке на процесс (и, при включенном
+    MENU_CLUSTER_LOCK, в одном процессе на кластер). Остальные запросы в это время
+    получают предыдущую скомпилированную версию, если она устарела не более
+    чем на MENU_MAX_STALENESS секунд.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.stats = {
+            'rebuilds': 0,
+            'coalesced': 0,
+            'stale_served': 0,
+            'shared_hits': 0,
+            'patched': 0,
+        }
+
+    def get(self, menu_name):
+        """Возвращает актуальное скомпилированное меню или None, если меню не существует."""
+        version, changed_at = get_menu_state(menu_name)
+        entry = self._entries.get(menu_name)
+        if self._is_fresh(entry, version):
+            return entry
+
+        lock = self._get_lock(menu_name)
+        if not lock.acquire(blocking=False):
+            # Меню уже перестраивается другим потоком
+            if self._can_serve_stale(entry, changed_at):
+                self._count('stale_served')
+                return entry
+            lock.acquire()
+
+        try:
+            # Пока мы ждали блокировку, меню мог перестроить другой поток
+            current = self._entries.get(menu_name)
+            if self._is_fresh(current, version):
+                self._count('coalesced')
+                return current
+            if current is not None and self._patch(menu_name, current, version):
+                self._count('patched')
+                return current
+            return self._rebuild(menu_name, version, current, changed_at)
+        finally:
+            lock.release()
+
+    def clear(self):
+        """Удаляет все скомпилированные меню этого процесса."""
+        with self._guard:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Возвращает снимок метрик перестроения."""
+        with self._guard:
+            return dict(self.stats)
+
+    def _get_lock(self, menu_name):
+        with self._guard:
+            return self._locks.setdefault(menu_name, threading.Lock())
+
+    def _count(self, metric):
+        with self._guard:
+            self.stats[metric] += 1
+
+    def _is_fresh(self, entry, version):
+        """Проверяет, что меню соответствует текущей версии и не превысило время жизни."""
+        if entry is None or version is None or entry.version != version:
+            return False
+        ttl = get_compiled_ttl()
+        return ttl is None or time.monotonic() - entry.built_at <= ttl
+
+    def _can_serve_stale(self, entry, changed_at):
+        """
+        Проверяет, можно ли отдать устаревшую версию, пока идет перестроение.
+        Устаревание отсчитывается от момента изменения меню; если он неизвестен,
+        устаревшая версия не отдается.
+        """
+        if entry is None or changed_at is None:
+            return False
+        max_staleness = get_setting('MAX_STALENESS', DEFAULT_MAX_STALENESS)
+        return time.time() - changed_at <= max_staleness
+
+    def _patch(self, menu_name, entry, version):
+        """
+        Применяет к скомпилированному меню цепочку изменений до версии version.
+        Возвращает False, если какого-то изменения нет в кэше - тогда меню перестраивается целиком.
+        """
+        if version is None or entry.version is None:
+            return False
+        if not 0 < version - entry.version <= get_setting('MAX_DELTAS', DEFAULT_MAX_DELTAS):
+            return False
+
+        keys = [
+            DELTA_KEY.format(name=menu_name, version=number)
+            for number in range(entry.version + 1, version + 1)
+        ]
+        deltas = get_cache().get_many(keys)
+        if len(deltas) != len(keys):
+            return False
+
+        for key in keys:
+            if not entry.apply_delta(deltas[key]):
+                return False
+
+        entry.version = version
+        return True
+
+    def _rebuild(self, menu_name, version, stale_entry, changed_at):
+        if get_setting('CLUSTER_LOCK', DEFAULT_CLUSTER_LOCK):
+            data = self._load_shared(menu_name, version, stale_entry, changed_at)
+            if isinstance(data, CompiledMenu):
+                return data
+        else:
+            data = self._load_from_db(menu_name)
+            self._count('rebuilds')
+
+        if data is None:
+            self._entries.pop(menu_name, None)
+            return None
+
+        compiled = CompiledMenu(data[0], data[1], version)
+        self._entries[menu_name] = compiled
+        return compiled
+
+    def _load_shared(self, menu_name, version, stale_entry, changed_at):
+        """
+        Загружает данные меню через общий кэш, чтобы в кластере из БД меню
+        перестраивал только один процесс. Возвращает кортеж (menu, items), None
+        для несуществующего меню или устаревшую запись, если ее можно отдать.
+        """
+        cache = get_cache()
+        compiled_key = COMPILED_KEY.format(name=menu_name, version=version)
+        lock_key = LOCK_KEY.format(name=menu_name)
+        lock_timeout = get_setting('LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+
+        data = cache.get(compiled_key)
+        if data is not None:
+            self._count('shared_hits')
+            return data
+
+        owns_lock = cache.add(lock_key, version, timeout=lock_timeout)
+        if not owns_lock:
+            if self._can_serve_stale(stale_entry, changed_at):
+                self._count('stale_served')
+                return stale_entry
+
+            # Ждем, пока другой процесс положит меню в общий кэш
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                data = cache.get(compiled_key)
+                if data is not None:
+                    self._count('coalesced')
+                    return data
+            # Блокировка не освободилась вовремя - перестраиваем сами
+
+        try:
+            data = self._load_from_db(menu_name)
+            self._count('rebuilds')
+            if data is not None:
+                compiled_timeout = get_setting('COMPILED_TIMEOUT', DEFAULT_COMPILED_TIMEOUT)
+                cache.set(compiled_key, data, timeout=compiled_timeout)
+        finally:
+            if owns_lock:
+                cache.delete(lock_key)
+        return data
+
+    def _load_from_db(self, menu_name):
+        """Загружает меню и его пункты из БД. Возвращает (menu, items) или None."""
+        try:
+            menu = Menu.objects.get(name=menu_name)
+        except Menu.DoesNotExist:
+            return None
+        items = list(MenuItem.objects.filter(menu=menu).select_related('parent'))
+        return menu, items
+
+
+menu_store = MenuStore()
@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+
+DEFAULT_MAX_DEPTH = 10
+
+
+def find_integrity_problems(rows, max_depth=DEFAULT_MAX_DEPTH):
+    """
+    Проверяет целостность деревьев меню за один проход по строкам
+    (id, menu_id, parent_id, order).
+
+    Возвращает словарь menu_id -> словарь проблем:
+    - orphans - пункты, родитель которых не существует
+    - cross_menu - пункты, родитель которых принадлежит другому меню
+    - cycles - пункты, входящие в циклы
+    - depth_outliers - пункты глубже max_depth (id -> глубина)
+    - duplicate_order - (parent_id, order) -> id пунктов с одинаковым порядком
+    """
+    rows = list(rows)
+    menu_of = {item_id: menu_id for item_id, menu_id, _, _ in rows}
+    parent_of = {}
+    problems = defaultdict(lambda: defaultdict(list))
+    siblings = defaultdict(list)
+
+    for item_id, menu_id, parent_id, order in rows:
+        siblings[menu_id, parent_id, order].append(item_id)
+        if parent_id is None:
+            continue
+        if parent_id not in menu_of:
+            problems[menu_id]['orphans'].append(item_id)
+        elif menu_of[parent_id] != menu_id:
+            problems[menu_id]['cross_menu'].append(item_id)
+        else:
+            parent_of[item_id] = parent_id
+
+    # Глубина пунктов; None - пункт в цикле или под циклом
+    depth = {}
+    for start in menu_of:
+        path = []
+        position = {}
+        node = start
+        while node is not None and node not in depth:
+            if node in position:
+                cycle = path[position[node]:]
+                problems[menu_of[node]]['cycles'].extend(cycle)
+                for item_id in cycle:
+                    depth[item_id] = None
+                break
+            position[node] = len(path)
+            path.append(node)
+            node = parent_of.get(node)
+
+        current = depth.get(node, -1) if node is not None else -1
+        for item_id in reversed(path):
+            if item_id in depth:
+                continue
+            current = None if current is None else current + 1
+            depth[item_id] = current
+            if current is not None and current > max_depth:
+                problems[menu_of[item_id]]['depth_outliers'].append((item_id, current))
+
+    for (menu_id, parent_id, order), item_ids in siblings.items():
+        if len(item_ids) > 1:
+            problems[menu_id]['duplicate_order'].append((parent_id, order, sorted(item_ids)))
+
+    return {menu_id: dict(menu_problems) for menu_id, menu_problems in problems.items()}
@@ -0,0 +1,9 @@
+from django.urls import include, path
+from . import views
+from .synthetic import SYNTHETIC_PREFIX
+
+# Маршруты для loadtest_menu: страницы сайта и страницы пунктов синтетического меню
+urlpatterns = [
+    path(f'{SYNTHETIC_PREFIX}<str:menu_name>/<path:item_path>/', views.synthetic_page, name='synthetic_page'),
+    path('', include('menu.urls')),
+]
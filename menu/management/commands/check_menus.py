@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from menu.integrity import DEFAULT_MAX_DEPTH, find_integrity_problems
+from menu.models import Menu, MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Проверяет целостность деревьев меню: сироты, циклы, глубина, одинаковый порядок соседей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('menus', nargs='*', help='Имена меню (по умолчанию - все меню)')
+        parser.add_argument(
+            '--max-depth', type=int, default=DEFAULT_MAX_DEPTH,
+            help='Пункты глубже этого уровня считаются выбросами'
+        )
+
+    def handle(self, *args, **options):
+        menus = Menu.objects.all()
+        if options['menus']:
+            menus = menus.filter(name__in=options['menus'])
+            missing = set(options['menus']) - set(menus.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f'Меню не найдены: {", ".join(sorted(missing))}')
+        menu_names = dict(menus.values_list('id', 'name'))
+
+        # Все пункты проверяемых меню одним запросом. Родители из других меню нужны,
+        # чтобы отличить ссылку на чужое меню от ссылки на несуществующий пункт.
+        items = MenuItem.objects.filter(menu_id__in=menu_names)
+        rows = list(items.values_list('id', 'menu_id', 'parent_id', 'order'))
+        known_ids = {row[0] for row in rows}
+        parent_ids = {row[2] for row in rows if row[2] is not None} - known_ids
+        rows += [
+            row for row in MenuItem.objects.filter(id__in=parent_ids).values_list('id', 'menu_id', 'parent_id', 'order')
+        ]
+
+        problems = find_integrity_problems(rows, max_depth=options['max_depth'])
+
+        failed = 0
+        for menu_id, name in sorted(menu_names.items(), key=lambda x: x[1]):
+            menu_problems = problems.get(menu_id)
+            if not menu_problems:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+                continue
+
+            failed += 1
+            self.stdout.write(self.style.ERROR(f'{name}:'))
+            for item_id in menu_problems.get('orphans', []):
+                self.stdout.write(f'  пункт {item_id}: родитель не существует')
+            for item_id in menu_problems.get('cross_menu', []):
+                self.stdout.write(f'  пункт {item_id}: родитель из другого меню')
+            if menu_problems.get('cycles'):
+                cycle = ', '.join(str(item_id) for item_id in menu_problems['cycles'])
+                self.stdout.write(f'  цикл: {cycle}')
+            for item_id, depth in menu_problems.get('depth_outliers', []):
+                self.stdout.write(f'  пункт {item_id}: глубина {depth} больше {options["max_depth"]}')
+            for parent_id, order, item_ids in menu_problems.get('duplicate_order', []):
+                parent = parent_id if parent_id is not None else 'корень'
+                ids = ', '.join(str(item_id) for item_id in item_ids)
+                self.stdout.write(f'  родитель {parent}, порядок {order}: пункты {ids}')
+
+        if failed:
+            raise CommandError(f'Найдены проблемы в меню: {failed}')
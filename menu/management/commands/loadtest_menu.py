@@ -0,0 +1,205 @@
+import json
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+
+LOADTEST_URLCONF = 'menu.loadtest_urls'
+
+
+def _percentile(sorted_values, percent):
+    """Возвращает перцентиль отсортированного списка (метод ближайшего ранга)."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _summarize(latencies):
+    """Сводка задержек в миллисекундах."""
+    values = sorted(latencies)
+    return {
+        'p50': round(_percentile(values, 50), 3),
+        'p95': round(_percentile(values, 95), 3),
+        'p99': round(_percentile(values, 99), 3),
+        'mean': round(sum(values) / len(values), 3) if values else 0.0,
+        'max': round(values[-1], 3) if values else 0.0,
+    }
+
+
+def init_worker(root_urlconf):
+    """Инициализирует дочерний процесс пула: настройка Django и маршруты нагрузочного теста."""
+    django.setup()
+    if root_urlconf:
+        override_settings(ROOT_URLCONF=root_urlconf).enable()
+
+
+def run_requests(paths, host):
+    """
+    Выполняет запросы к WSGI приложению в текущем потоке или процессе.
+    Возвращает список кортежей (path, status_code, latency_ms, queries).
+    """
+    client = Client(HTTP_HOST=host, raise_request_exception=False)
+    samples = []
+    try:
+        for path in paths:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(path)
+                latency = (time.perf_counter() - started) * 1000
+            samples.append((path, response.status_code, latency, len(queries)))
+    finally:
+        connection.close()
+    return samples
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочное тестирование страниц меню внутри процесса с отчетом в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Общее количество запросов')
+        parser.add_argument('--workers', type=int, default=4, help='Количество потоков или процессов')
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default='thread',
+            help='Тип пула исполнителей'
+        )
+        parser.add_argument(
+            '--paths', nargs='+', default=None,
+            help='Явный список путей (по умолчанию - все маршруты menu/urls.py)'
+        )
+        parser.add_argument(
+            '--synthetic', type=int, default=0, metavar='N',
+            help='Заменить пункты меню --menu синтетическим деревом из N элементов и брать пути из него'
+        )
+        parser.add_argument(
+            '--menu', default=None,
+            help='Меню для синтетического дерева (по умолчанию synthetic_menu)'
+        )
+        parser.add_argument(
+            '--noinput', '--no-input', action='store_false', dest='interactive',
+            help='Не спрашивать подтверждение перед удалением пунктов меню'
+        )
+        parser.add_argument('--warmup', type=int, default=1, help='Прогревочных запросов на каждый путь')
+        parser.add_argument('--seed', type=int, default=None, help='Seed для выбора путей')
+        parser.add_argument('--host', default='localhost', help='Значение заголовка Host')
+        parser.add_argument('--output', default=None, help='Файл для JSON отчета (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['workers'] < 1:
+            raise CommandError('--requests и --workers должны быть положительными')
+
+        rng = random.Random(options['seed'])
+        root_urlconf = None
+
+        if options['synthetic']:
+            from menu.synthetic import SYNTHETIC_MENU, build_synthetic_menu
+
+            menu_name = options['menu'] or SYNTHETIC_MENU
+            self.confirm_replace(menu_name, options['interactive'])
+            menu_paths = build_synthetic_menu(menu_name, options['synthetic'], seed=options['seed'])
+            paths = [rng.choice(menu_paths) for _ in range(options['requests'])]
+            # Пути синтетических пунктов обслуживает отдельный маршрут
+            root_urlconf = LOADTEST_URLCONF
+        else:
+            route_paths = options['paths'] or self.get_route_paths()
+            paths = [route_paths[i % len(route_paths)] for i in range(options['requests'])]
+            rng.shuffle(paths)
+
+        with override_settings(ROOT_URLCONF=root_urlconf) if root_urlconf else nullcontext():
+            # Прогрев: компиляция меню и шаблонов не должна попадать в замеры
+            if options['warmup']:
+                run_requests(sorted(set(paths)) * options['warmup'], options['host'])
+
+            chunks = [paths[i::options['workers']] for i in range(options['workers'])]
+            started = time.perf_counter()
+            samples = self.run_pool(options['pool'], chunks, options['host'], root_urlconf)
+            duration = time.perf_counter() - started
+
+        report = self.build_report(samples, duration, options)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f'Отчет записан в {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def confirm_replace(self, menu_name, interactive):
+        """Запрашивает подтверждение, если у меню уже есть пункты, которые будут удалены."""
+        from menu.models import MenuItem
+
+        count = MenuItem.objects.filter(menu__name=menu_name).count()
+        if not count or not interactive:
+            return
+        answer = input(f'Пункты меню {menu_name} ({count}) будут удалены. Продолжить? [y/N] ')
+        if answer.strip().lower() not in ('y', 'yes'):
+            raise CommandError('Нагрузочное тестирование отменено')
+
+    def get_route_paths(self):
+        """Возвращает пути всех маршрутов приложения menu без параметров."""
+        from menu.synthetic import get_route_names
+
+        return [reverse(name) for name in get_route_names()]
+
+    def run_pool(self, pool, chunks, host, root_urlconf=None):
+        """Выполняет части нагрузки в пуле потоков или процессов."""
+        if pool == 'process':
+            # Дочерние процессы не должны наследовать открытые соединения с БД
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=len(chunks), initializer=init_worker, initargs=(root_urlconf,)
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=len(chunks))
+
+        with executor:
+            futures = [executor.submit(run_requests, chunk, host) for chunk in chunks if chunk]
+            return [sample for future in futures for sample in future.result()]
+
+    def get_path_group(self, path):
+        """
+        Группа пути для отчета. Синтетические пути группируются по глубине пункта,
+        иначе отчет содержал бы строку на каждый пункт.
+        """
+        from menu.synthetic import SYNTHETIC_PREFIX
+
+        if path.startswith(f'/{SYNTHETIC_PREFIX}'):
+            depth = path.strip('/').count('/') - 2
+            return f'/{SYNTHETIC_PREFIX}<depth {depth}>'
+        return path
+
+    def build_report(self, samples, duration, options):
+        """Строит JSON отчет по результатам запросов."""
+        latencies = [sample[2] for sample in samples]
+        queries = [sample[3] for sample in samples]
+        by_path = defaultdict(list)
+        for path, _, latency, _ in samples:
+            by_path[self.get_path_group(path)].append(latency)
+
+        return {
+            'pool': options['pool'],
+            'workers': options['workers'],
+            'requests': len(samples),
+            'duration_s': round(duration, 3),
+            'throughput_rps': round(len(samples) / duration, 2) if duration else 0.0,
+            'latency_ms': _summarize(latencies),
+            'queries_per_request': {
+                'mean': round(sum(queries) / len(queries), 3) if queries else 0.0,
+                'max': max(queries, default=0),
+            },
+            'status_codes': {str(code): count for code, count in sorted(Counter(s[1] for s in samples).items())},
+            'paths': {
+                path: dict(_summarize(values), requests=len(values))
+                for path, values in sorted(by_path.items())
+            },
+        }
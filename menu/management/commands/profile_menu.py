@@ -0,0 +1,145 @@
+import cProfile
+import io
+import json
+import pstats
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context
+from django.test import RequestFactory
+from menu.cache import menu_store
+from menu.templatetags.menu_tags import draw_menu
+
+
+# Этапы отрисовки: имя этапа -> (окончание пути файла, имя функции)
+PHASES = {
+    'draw_menu': ('menu/templatetags/menu_tags.py', 'draw_menu'),
+    'load_menu_data': ('menu/templatetags/menu_tags.py', 'load_menu_data'),
+    'menu_store.get': ('menu/cache.py', 'get'),
+    'find_active_id': ('menu/cache.py', 'find_active_id'),
+    'is_active': ('menu/models.py', 'is_active'),
+    'get_url': ('menu/models.py', 'get_url'),
+    'reverse': ('django/urls/base.py', 'reverse'),
+    'expand_ancestors': ('menu/templatetags/menu_tags.py', '_expand_ancestors'),
+    'render': ('menu/templatetags/menu_tags.py', 'render'),
+    'render_menu_item': ('menu/templatetags/menu_tags.py', 'render_menu_item'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Профилирует отрисовку меню для заданных путей (cProfile и tracemalloc)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('menu', help='Имя меню')
+        parser.add_argument('paths', nargs='+', help='Пути страниц, для которых отрисовывается меню')
+        parser.add_argument('--iterations', type=int, default=100, help='Количество отрисовок на каждый путь')
+        parser.add_argument(
+            '--mode', choices=['warm', 'render', 'rebuild'], default='render',
+            help='warm - как в работе, с готовыми вариантами; render - без кэша отрисовки и индекса URL; '
+                 'rebuild - с перестроением меню на каждой итерации'
+        )
+        parser.add_argument('--top', type=int, default=20, help='Количество строк в отчетах')
+        parser.add_argument('--pstats', default='profile_menu.pstats', help='Файл для статистики pstats')
+        parser.add_argument('--baseline', default=None, help='JSON с базовыми временами этапов для сравнения')
+        parser.add_argument('--save-baseline', default=None, help='Сохранить времена этапов в JSON')
+        parser.add_argument(
+            '--threshold', type=float, default=10.0,
+            help='Замедление этапа относительно базы в процентах, при котором он отмечается'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должно быть положительным')
+        if menu_store.get(options['menu']) is None:
+            raise CommandError(f'Меню не найдено: {options["menu"]}')
+
+        factory = RequestFactory()
+        contexts = [Context({'request': factory.get(path)}) for path in options['paths']]
+        iterations = options['iterations']
+
+        # Прогрев, чтобы в профиль не попали первичная загрузка меню и импорт модулей
+        self.run(options['menu'], contexts, 1, 'warm')
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        self.run(options['menu'], contexts, iterations, options['mode'])
+        profiler.disable()
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(options['top'])
+        self.stdout.write(stream.getvalue())
+        stats.dump_stats(options['pstats'])
+        self.stdout.write(f'Статистика pstats записана в {options["pstats"]}\n')
+
+        phases = self.get_phase_timings(stats, iterations * len(contexts))
+        self.print_phases(phases, options)
+
+        # Выделения памяти измеряются отдельным проходом, чтобы не искажать время
+        tracemalloc.start()
+        self.run(options['menu'], contexts, iterations, options['mode'])
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        self.print_allocations(snapshot, options['top'])
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as f:
+                json.dump(phases, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'База сохранена в {options["save_baseline"]}'))
+
+    def run(self, menu_name, contexts, iterations, mode):
+        """Отрисовывает меню iterations раз для каждого пути."""
+        for _ in range(iterations):
+            for context in contexts:
+                if mode == 'rebuild':
+                    menu_store.clear()
+                elif mode == 'render':
+                    compiled = menu_store.get(menu_name)
+                    compiled.variants.clear()
+                    compiled.urls.clear()
+                    compiled.active_by_path.clear()
+                draw_menu(context, menu_name)
+
+    def get_phase_timings(self, stats, renders):
+        """Возвращает для каждого этапа количество вызовов и время на одну отрисовку в мс."""
+        phases = {}
+        for phase, (file_suffix, function) in PHASES.items():
+            calls = 0
+            cumulative = 0.0
+            for (filename, _, name), (_, total_calls, _, cumulative_time, _) in stats.stats.items():
+                if name == function and filename.replace('\\', '/').endswith(file_suffix):
+                    calls += total_calls
+                    cumulative += cumulative_time
+            phases[phase] = {
+                'calls_per_render': round(calls / renders, 3),
+                'ms_per_render': round(cumulative * 1000 / renders, 4),
+            }
+        return phases
+
+    def print_phases(self, phases, options):
+        """Печатает время этапов и отмечает замедления относительно базы."""
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        self.stdout.write('Этапы отрисовки (на одну отрисовку):')
+        for phase, timing in phases.items():
+            line = f'  {phase:<18} {timing["ms_per_render"]:>10.4f} мс  {timing["calls_per_render"]:>10.3f} вызовов'
+            base = baseline.get(phase)
+            if base and base['ms_per_render']:
+                change = (timing['ms_per_render'] / base['ms_per_render'] - 1) * 100
+                line += f'  {change:+.1f}%'
+                if change > options['threshold']:
+                    line = self.style.ERROR(line + '  МЕДЛЕННЕЕ')
+            self.stdout.write(line)
+
+    def print_allocations(self, snapshot, top):
+        """Печатает места с наибольшим объемом выделенной памяти."""
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        self.stdout.write('Места выделения памяти:')
+        for statistic in snapshot.statistics('lineno')[:top]:
+            self.stdout.write(f'  {statistic}')
@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connections, models, DEFAULT_DB_ALIAS
 from django.urls import reverse, NoReverseMatch
 from django.utils.text import slugify
 
@@ -16,6 +17,10 @@ class Menu(models.Model):
         return self.name
 
 
+# Ограничение глубины обхода предков, чтобы запрос завершался даже на данных с циклами
+ANCESTOR_DEPTH_LIMIT = 1000
+
+
 class MenuItem(models.Model):
     """Представляет отдельный пункт в иерархической структуре меню."""
     menu = models.ForeignKey(Menu, on_delete=models.CASCADE, related_name='items')
@@ -52,6 +57,58 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.title} ({self.menu.name})"
 
+    def clean(self):
+        super().clean()
+        self.validate_tree()
+
+    def save(self, *args, **kwargs):
+        self.validate_tree()
+        super().save(*args, **kwargs)
+
+    def validate_tree(self):
+        """
+        Проверяет целостность дерева: родитель принадлежит тому же меню и не является
+        самим пунктом или его потомком (иначе в дереве появится цикл), а пункт с детьми
+        не переносится в другое меню.
+        """
+        if self.menu_id is None:
+            return
+        items = MenuItem.objects.using(self._state.db or DEFAULT_DB_ALIAS)
+
+        if self.pk is not None and items.filter(parent_id=self.pk).exclude(menu_id=self.menu_id).exists():
+            raise ValidationError({'menu': 'Пункт с дочерними пунктами нельзя перенести в другое меню.'})
+
+        if self.parent_id is None:
+            return
+
+        parent_menu_id = items.filter(pk=self.parent_id).values_list('menu_id', flat=True).first()
+        if parent_menu_id is not None and parent_menu_id != self.menu_id:
+            raise ValidationError({'parent': 'Родительский пункт должен принадлежать тому же меню.'})
+
+        if self.pk is not None and self.is_ancestor_of_id(self.parent_id):
+            raise ValidationError({'parent': 'Пункт не может быть вложен в самого себя или в своего потомка.'})
+
+    def is_ancestor_of_id(self, item_id):
+        """
+        Проверяет, является ли этот пункт пунктом item_id или одним из его предков.
+        Предки обходятся одним рекурсивным запросом по первичному ключу.
+        """
+        connection = connections[self._state.db or DEFAULT_DB_ALIAS]
+        table = connection.ops.quote_name(self._meta.db_table)
+        query = f"""
+            WITH RECURSIVE ancestors (id, parent_id, depth) AS (
+                SELECT id, parent_id, 0 FROM {table} WHERE id = %s
+                UNION ALL
+                SELECT item.id, item.parent_id, ancestors.depth + 1
+                FROM {table} item JOIN ancestors ON item.id = ancestors.parent_id
+                WHERE ancestors.depth < %s
+            )
+            SELECT 1 FROM ancestors WHERE id = %s LIMIT 1
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(query, [item_id, ANCESTOR_DEPTH_LIMIT, self.pk])
+            return cursor.fetchone() is not None
+
     def get_url(self):
         """
         Возвращает URL для этого пункта меню.
@@ -69,14 +126,16 @@ class MenuItem(models.Model):
 
         return '#'
 
-    def is_active(self, current_url):
+    def is_active(self, current_url, item_url=None):
         """
         Проверяет, является ли этот пункт меню активным на основе текущего URL.
+        item_url позволяет передать заранее вычисленный URL пункта.
         """
         if not current_url:
             return False
 
-        item_url = self.get_url()
+        if item_url is None:
+            item_url = self.get_url()
         if not item_url or item_url == '#':
             return False
 
@@ -111,8 +170,10 @@ class MenuItem(models.Model):
     def get_ancestors(self, all_items=None):
         """Получает всех предков этого пункта меню."""
         ancestors = []
+        seen = {self.id}
         current = self.parent
-        while current:
+        while current and current.id not in seen:
+            seen.add(current.id)
             ancestors.append(current)
             # Если у нас есть all_items, используем его, чтобы избежать запросов к БД
             if all_items:
@@ -0,0 +1,159 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_menu_version, item_delta, item_removed_delta, store_menu_delta
+from .models import Menu, MenuItem
+
+
+class MenuChange:
+    """
+    Изменения одного меню в текущей транзакции, публикуемые после коммита.
+
+    delta сохраняется, только если в транзакции изменен ровно один пункт. Массовые
+    изменения (каскадное удаление, перестроение синтетического меню) публикуются
+    одной сменой версии без delta: цепочку из сотен изменений процессы все равно
+    не стали бы применять (MENU_MAX_DELTAS).
+    """
+
+    def __init__(self, menu_name, menu_id=None):
+        self.menu_name = menu_name
+        self.menu_id = menu_id
+        # Меню удаляется целиком - изменения его пунктов не публикуются по отдельности
+        self.menu_deleted = False
+        self.item_ids = set()
+        self.delta = None
+        self.full = False
+        self.published = False
+        # Процессы, прочитавшие меню до коммита, перестроят его целиком
+        self.version = bump_menu_version(menu_name)
+
+    def add(self, delta):
+        if delta is None:
+            self.full = True
+            return
+        self.item_ids.add(delta['id'] if delta['op'] == 'delete' else delta['fields']['id'])
+        # Повторное сохранение того же пункта заменяет его предыдущее изменение
+        self.delta = delta
+
+    def get_delta(self):
+        if self.full or len(self.item_ids) != 1:
+            return None
+        return self.delta
+
+    def __call__(self):
+        self.published = True
+        delta = self.get_delta()
+        if delta is not None and self.version is not None:
+            store_menu_delta(self.menu_name, self.version, delta)
+        bump_menu_version(self.menu_name, delta)
+
+
+def get_pending_change(menu_name=None, menu_id=None):
+    """
+    Возвращает неопубликованное изменение меню (по имени или id) в текущей транзакции
+    или None. При поиске по id берется последнее изменение - меню могли переименовать.
+    """
+    for entry in reversed(transaction.get_connection().run_on_commit):
+        callback = entry[1]
+        if not isinstance(callback, MenuChange) or callback.published:
+            continue
+        if callback.menu_name == menu_name if menu_name is not None else callback.menu_id == menu_id:
+            return callback
+    return None
+
+
+def invalidate_menu(menu_name, delta=None, menu_id=None):
+    """
+    Помечает меню как измененное.
+
+    Внутри транзакции версия меняется сразу при первом изменении меню (без delta -
+    процессы, успевшие прочитать меню до коммита, перестроят его целиком) и еще раз
+    после коммита. Если в транзакции изменен один пункт, после коммита delta
+    публикуется для обеих версий, так что остальные процессы обновляют меню на месте.
+    При откате транзакции delta не публикуется.
+    Возвращает изменение текущей транзакции или None вне транзакции.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        bump_menu_version(menu_name, delta)
+        return None
+
+    change = get_pending_change(menu_name)
+    if change is None:
+        change = MenuChange(menu_name, menu_id)
+        transaction.on_commit(change)
+    elif change.menu_id is None:
+        change.menu_id = menu_id
+    change.add(delta)
+    return change
+
+
+def _menu_name_for(item):
+    """
+    Возвращает имя меню пункта или None, если меню уже удалено.
+    Имя берется из загруженного меню или изменения текущей транзакции, чтобы
+    массовое удаление пунктов не выполняло запрос на каждый пункт.
+    """
+    if MenuItem.menu.is_cached(item):
+        return item.menu.name
+    change = get_pending_change(menu_id=item.menu_id)
+    if change is not None:
+        return change.menu_name
+    return Menu.objects.filter(pk=item.menu_id).values_list('name', flat=True).first()
+
+
+@receiver(pre_save, sender=Menu)
+def menu_pre_save(sender, instance, **kwargs):
+    """При переименовании меню сбрасывает версию под старым именем."""
+    if instance.pk is None:
+        return
+    old_name = Menu.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+    if old_name and old_name != instance.name:
+        invalidate_menu(old_name)
+
+
+@receiver(pre_delete, sender=Menu)
+def menu_pre_delete(sender, instance, **kwargs):
+    """Отмечает удаляемое меню, чтобы каскадное удаление пунктов не публиковало их изменения."""
+    change = invalidate_menu(instance.name, menu_id=instance.pk)
+    if change is not None:
+        change.menu_deleted = True
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+def menu_changed(sender, instance, **kwargs):
+    invalidate_menu(instance.name, menu_id=instance.pk)
+
+
+@receiver(pre_save, sender=MenuItem)
+def menu_item_pre_save(sender, instance, **kwargs):
+    """При переносе пункта в другое меню удаляет его из старого меню."""
+    if instance.pk is None:
+        return
+    old_menu_name = (
+        MenuItem.objects.filter(pk=instance.pk)
+        .exclude(menu_id=instance.menu_id)
+        .values_list('menu__name', flat=True)
+        .first()
+    )
+    if old_menu_name:
+        invalidate_menu(old_menu_name, item_removed_delta(instance))
+
+
+@receiver(post_save, sender=MenuItem)
+def menu_item_saved(sender, instance, **kwargs):
+    menu_name = _menu_name_for(instance)
+    if menu_name:
+        invalidate_menu(menu_name, item_delta(instance), menu_id=instance.menu_id)
+
+
+@receiver(post_delete, sender=MenuItem)
+def menu_item_deleted(sender, instance, **kwargs):
+    change = get_pending_change(menu_id=instance.menu_id)
+    if change is not None and change.menu_deleted:
+        # Меню удаляется целиком и уже помечено как измененное
+        return
+    menu_name = _menu_name_for(instance)
+    if menu_name:
+        invalidate_menu(menu_name, item_removed_delta(instance), menu_id=instance.menu_id)
@@ -0,0 +1,70 @@
+import random
+
+from django.db import transaction
+from django.urls import URLPattern
+
+from .models import Menu, MenuItem
+from .signals import invalidate_menu
+
+
+SYNTHETIC_MENU = 'synthetic_menu'
+SYNTHETIC_PREFIX = 'synthetic/'
+SYNTHETIC_ROOTS = 10
+SYNTHETIC_FANOUT = 8
+
+
+def get_route_names():
+    """Возвращает имена маршрутов приложения menu без параметров."""
+    from . import urls
+
+    return [
+        pattern.name
+        for pattern in urls.urlpatterns
+        if isinstance(pattern, URLPattern) and pattern.name and not pattern.pattern.converters
+    ]
+
+
+@transaction.atomic
+def build_synthetic_menu(menu_name, size, seed=None):
+    """
+    Заменяет пункты меню синтетическим деревом из size элементов.
+
+    Каждый пункт получает собственный путь /synthetic/<меню>/<номер>/.../, вложенный
+    в путь родителя. Пути обслуживает маршрут из menu/loadtest_urls.py, поэтому при
+    запросе пункт становится активным и отрисовывается его ветка.
+    Возвращает список URL всех пунктов.
+    """
+    rng = random.Random(seed)
+    menu, _ = Menu.objects.get_or_create(
+        name=menu_name,
+        defaults={'description': 'Синтетическое меню для нагрузочного тестирования'}
+    )
+    MenuItem.objects.filter(menu=menu).delete()
+
+    prefix = f'/{SYNTHETIC_PREFIX}{menu_name}/'
+    roots = [
+        MenuItem(menu=menu, title=f'Section {order}', explicit_url=f'{prefix}{order}/', order=order)
+        for order in range(min(SYNTHETIC_ROOTS, size))
+    ]
+    level = MenuItem.objects.bulk_create(roots)
+    urls = [item.explicit_url for item in level]
+
+    # Каждый следующий уровень в SYNTHETIC_FANOUT раз больше предыдущего
+    while len(urls) < size and level:
+        batch = []
+        for order in range(min(len(level) * SYNTHETIC_FANOUT, size - len(urls))):
+            parent = rng.choice(level)
+            number = len(urls) + order
+            batch.append(MenuItem(
+                menu=menu,
+                parent=parent,
+                title=f'Item {number}',
+                explicit_url=f'{parent.explicit_url}{number}/',
+                order=order,
+            ))
+        level = MenuItem.objects.bulk_create(batch)
+        urls.extend(item.explicit_url for item in level)
+
+    # bulk_create не отправляет сигналы, поэтому версию меню меняем вручную
+    invalidate_menu(menu_name)
+    return urls
@@ -1,7 +1,7 @@
 from django import template
 from django.urls import resolve
 from django.utils.safestring import mark_safe
-from ..models import Menu, MenuItem
+from ..cache import menu_store
 
 register = template.Library()
 
@@ -9,55 +9,51 @@ register = template.Library()
 class MenuRenderer:
     """Вспомогательный класс для отрисовки меню с правильной логикой разворачивания, используя ровно один запрос к БД."""
 
-    def __init__(self, menu_name, current_url):
+    def __init__(self, menu_name, current_url, max_depth=None, expand_all=False, root=None, siblings_only=False):
         self.menu_name = menu_name
         self.current_url = current_url
+        # Параметры отрисовки
+        self.expand_all = expand_all
+        self.root = root
+        self.siblings_only = siblings_only
+        # siblings_only отрисовывает только уровень активного пункта, без вложенных веток
+        if siblings_only:
+            max_depth = 1 if max_depth is None else min(max_depth, 1)
+        self.max_depth = max_depth
         self.menu = None
-        self.all_items = []
+        self.compiled = None
+        self.generation = None
+        self.version = None
         self.active_item = None
         self.expanded_items = set()
         self.item_children = {}
+        self.visible_items = set()
 
     def load_menu_data(self):
-        """Загружает данные меню с помощью ровно одного запроса к БД."""
-        try:
-            # Один запрос для получения всех пунктов меню для этого меню
-            self.menu = Menu.objects.get(name=self.menu_name)
-            self.all_items = list(MenuItem.objects.filter(menu=self.menu).select_related('parent'))
-        except Menu.DoesNotExist:
+        """
+        Загружает скомпилированное меню из хранилища процесса.
+        Запрос к БД выполняется только при перестроении меню после его изменения.
+        """
+        compiled = menu_store.get(self.menu_name)
+        if compiled is None:
             return
 
-        # Построение отображения детей
-        self._build_children_mapping()
+        self.compiled = compiled
+        # Поколение запоминается до чтения меню: если к меню применят изменение,
+        # отрисованный вариант не будет сохранен
+        self.generation = compiled.generation
+        self.version = compiled.version
+        self.menu = compiled.menu
+        self.item_children = compiled.children
 
         # Поиск активного элемента и определение развернутых элементов
         self._find_active_item_and_expanded()
 
-    def _build_children_mapping(self):
-        """Строит отображение parent_id в список детей."""
-        for item in self.all_items:
-            parent_id = item.parent_id if item.parent else None
-            if parent_id not in self.item_children:
-                self.item_children[parent_id] = []
-            self.item_children[parent_id].append(item)
-
-        # Сортировка детей по порядку и заголовку
-        for parent_id in self.item_children:
-            self.item_children[parent_id].sort(key=lambda x: (x.order, x.title))
-
     def _find_active_item_and_expanded(self):
         """Находит активный пункт меню и определяет, какие элементы должны быть развернуты."""
         # Найти наиболее специфичный активный элемент (самый длинный совпадающий URL)
-        active_candidates = []
-        for item in self.all_items:
-            if item.is_active(self.current_url):
-                active_candidates.append(item)
-
-        # Выбрать наиболее специфичный активный элемент (с самым длинным URL)
-        if active_candidates:
-            self.active_item = max(active_candidates, key=lambda x: len(x.get_url()))
-        else:
-            self.active_item = None
+        active_id = self.compiled.find_active_id(self.current_url)
+        self.active_item = self.compiled.items_by_id.get(active_id)
 
         if not self.active_item:
             return
@@ -66,17 +62,23 @@ class MenuRenderer:
         self.expanded_items.add(self.active_item.id)
 
         # Развернуть всех предков активного элемента
-        ancestors = self.active_item.get_ancestors(self.all_items)
-        for ancestor in ancestors:
-            self.expanded_items.add(ancestor.id)
+        self._expand_ancestors(self.active_item)
 
         # Развернуть первый уровень детей под активным элементом
         if self.active_item.id in self.item_children:
             for child in self.item_children[self.active_item.id]:
                 self.expanded_items.add(child.id)
 
+    def _expand_ancestors(self, item):
+        """Разворачивает всех предков пункта, поднимаясь по индексу скомпилированного меню."""
+        parent = self.compiled.items_by_id.get(item.parent_id)
+        while parent is not None and parent.id not in self.expanded_items:
+            self.expanded_items.add(parent.id)
+            parent = self.compiled.items_by_id.get(parent.parent_id)
+
     def render_menu_item(self, item, level=0):
         """Отрисовывает отдельный пункт меню рекурсивно."""
+        self.visible_items.add(item.id)
         is_active = item == self.active_item
         has_children = item.id in self.item_children
         is_expanded = item.id in self.expanded_items
@@ -92,10 +94,11 @@ class MenuRenderer:
 
         # Отрисовка элемента
         result = f'<li class="{" ".join(css_classes)}">'
-        result += f'<a href="{item.get_url()}">{item.title}</a>'
+        result += f'<a href="{self.compiled.get_url(item)}">{item.title}</a>'
 
-        # Отрисовка детей, если развернуто
-        if has_children and is_expanded:
+        # Отрисовка детей, если развернуто и не превышена максимальная глубина
+        within_depth = self.max_depth is None or level + 1 < self.max_depth
+        if has_children and (is_expanded or self.expand_all) and within_depth:
             result += '<ul>'
             for child in self.item_children[item.id]:
                 result += self.render_menu_item(child, level + 1)
@@ -104,31 +107,77 @@ class MenuRenderer:
         result += '</li>'
         return result
 
+    def get_top_parent_id(self):
+        """
+        Возвращает id пункта, дети которого образуют верхний уровень меню
+        (None - корневые элементы). Для несуществующего root возвращает False.
+        """
+        if self.root is not None:
+            root_item = self.compiled.find_item(self.root)
+            return root_item.id if root_item else False
+        if self.siblings_only and self.active_item:
+            return self.active_item.parent_id
+        return None
+
+    def get_variant_key(self, top_parent_id):
+        """Ключ отрисованного варианта: активный пункт и параметры отрисовки."""
+        active_id = self.active_item.id if self.active_item else None
+        return active_id, top_parent_id, self.max_depth, bool(self.expand_all)
+
     def render(self):
-        """Отрисовывает полное меню."""
+        """Отрисовывает меню, используя готовый вариант для активного пункта и параметров, если он есть."""
         if not self.menu:
             return ''
 
-        # Получить корневые элементы (элементы без родителя)
-        root_items = self.item_children.get(None, [])
+        top_parent_id = self.get_top_parent_id()
+        if top_parent_id is False or self.max_depth is not None and self.max_depth < 1:
+            return ''
+
+        key = self.get_variant_key(top_parent_id)
+        cached = self.compiled.get_variant(key)
+        if cached is not None:
+            return mark_safe(cached)
+
+        # Пункт верхнего уровня учитывается как отрисованный: изменение набора его детей меняет меню
+        if top_parent_id is not None:
+            self.visible_items.add(top_parent_id)
 
         result = '<ul class="tree-menu">'
-        for item in root_items:
+        for item in self.item_children.get(top_parent_id, []):
             result += self.render_menu_item(item)
         result += '</ul>'
 
+        self.compiled.set_variant(key, result, self.visible_items, self.generation)
         return mark_safe(result)
 
 
 @register.simple_tag(takes_context=True)
-def draw_menu(context, menu_name):
+def draw_menu(context, menu_name, max_depth=None, expand_all=False, root=None, siblings_only=False):
     """
     Template tag для отрисовки древовидного меню.
     Использование: {% draw_menu 'main_menu' %}
+
+    Параметры для уменьшения размера HTML:
+    - max_depth=2 - отрисовывать не более двух уровней
+    - expand_all=True - отрисовать все ветки (для меню, раскрываемых через JS)
+    - root=<пункт> - отрисовать только детей пункта (объект, id или named_url)
+    - siblings_only=True - отрисовать только уровень активного пункта
     """
     request = context.get('request')
     current_url = request.path if request else ''
 
-    renderer = MenuRenderer(menu_name, current_url)
+    renderer = MenuRenderer(
+        menu_name,
+        current_url,
+        max_depth=max_depth,
+        expand_all=expand_all,
+        root=root,
+        siblings_only=siblings_only,
+    )
     renderer.load_menu_data()
-    return renderer.render()
\ No newline at end of file
+
+    # Версия, по которой отрисовано меню, нужна кэшу страниц (menu.views.page)
+    menu_versions = getattr(request, 'menu_versions', None)
+    if menu_versions is not None:
+        menu_versions[menu_name] = renderer.version
+    return renderer.render()
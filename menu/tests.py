@@ -1,5 +1,15 @@
-from django.test import TestCase, RequestFactory
+import json
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command, CommandError
+from django.test import TestCase, RequestFactory, override_settings
 from django.urls import reverse
+from .cache import MenuStore, bump_menu_version
 from .models import Menu, MenuItem
 from .templatetags.menu_tags import MenuRenderer
 
@@ -78,6 +88,93 @@ class MenuModelTests(TestCase):
         self.assertFalse(item_no_url.is_active('/any/'))
 
 
+class MenuIntegrityTests(TestCase):
+    def setUp(self):
+        self.menu = Menu.objects.create(name='integrity_menu')
+        self.other_menu = Menu.objects.create(name='other_menu')
+        self.root = MenuItem.objects.create(menu=self.menu, title='Root', order=0)
+        self.child = MenuItem.objects.create(menu=self.menu, title='Child', parent=self.root, order=0)
+        self.grandchild = MenuItem.objects.create(menu=self.menu, title='Grandchild', parent=self.child, order=0)
+
+    def test_cross_menu_parent_rejected(self):
+        """Родитель из другого меню запрещен."""
+        item = MenuItem(menu=self.other_menu, title='Foreign', parent=self.root)
+        with self.assertRaises(ValidationError):
+            item.full_clean()
+        with self.assertRaises(ValidationError):
+            item.save()
+
+    def test_cycle_rejected(self):
+        """Пункт нельзя вложить в самого себя или в своего потомка."""
+        self.root.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.root.save()
+
+        self.child.parent = self.child
+        with self.assertRaises(ValidationError):
+            self.child.clean()
+
+    def test_move_with_children_to_other_menu_rejected(self):
+        """Пункт с детьми нельзя перенести в другое меню - дети остались бы с родителем из чужого меню."""
+        self.child.menu = self.other_menu
+        self.child.parent = None
+        with self.assertRaises(ValidationError):
+            self.child.full_clean()
+        with self.assertRaises(ValidationError):
+            self.child.save()
+        self.assertEqual(MenuItem.objects.get(pk=self.child.pk).menu, self.menu)
+
+        # Пункт без детей переносится
+        self.grandchild.menu = self.other_menu
+        self.grandchild.parent = None
+        self.grandchild.save()
+
+    def test_valid_move_allowed(self):
+        """Перенос пункта внутри меню без цикла разрешен."""
+        self.grandchild.parent = self.root
+        self.grandchild.full_clean()
+        self.grandchild.save()
+
+    def test_check_menus_reports_problems(self):
+        """check_menus находит циклы, глубину и одинаковый порядок соседей."""
+        MenuItem.objects.filter(pk=self.root.pk).update(parent=self.grandchild)
+        MenuItem.objects.create(menu=self.other_menu, title='A', order=0)
+        MenuItem.objects.create(menu=self.other_menu, title='B', order=0)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('check_menus', stdout=out)
+        output = out.getvalue()
+        self.assertIn('цикл', output)
+        self.assertIn('порядок 0', output)
+
+    def test_check_menus_ok(self):
+        """Корректное меню проходит проверку."""
+        out = StringIO()
+        call_command('check_menus', 'integrity_menu', stdout=out)
+        self.assertIn('integrity_menu: OK', out.getvalue())
+
+    def test_find_integrity_problems(self):
+        """Проверка целостности по строкам без обращения к БД."""
+        from .integrity import find_integrity_problems
+
+        rows = [
+            (1, 1, None, 0),
+            (2, 1, 1, 0),
+            (3, 1, 2, 0),
+            (4, 1, 99, 1),
+            (5, 1, 6, 2),
+            (6, 1, 5, 3),
+            (7, 2, 1, 0),
+        ]
+        problems = find_integrity_problems(rows, max_depth=1)
+        self.assertEqual(problems[1]['orphans'], [4])
+        self.assertEqual(sorted(problems[1]['cycles']), [5, 6])
+        self.assertEqual(problems[1]['depth_outliers'], [(3, 2)])
+        self.assertEqual(problems[2]['cross_menu'], [7])
+        self.assertNotIn('duplicate_order', problems[1])
+
+
 class MenuRendererTests(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -165,4 +262,503 @@ class TemplateTagTests(TestCase):
 
         result = template.render(context)
         self.assertIn('tree-menu', result)
-        self.assertIn('Test Item', result)
\ No newline at end of file
+        self.assertIn('Test Item', result)
+
+
+class RenderOptionsTests(TestCase):
+    def setUp(self):
+        self.menu = Menu.objects.create(name='options_menu')
+        self.home = MenuItem.objects.create(menu=self.menu, title='Home', named_url='home', order=0)
+        self.services = MenuItem.objects.create(menu=self.menu, title='Services', named_url='services', order=1)
+        self.web = MenuItem.objects.create(
+            menu=self.menu, title='Web', parent=self.services, named_url='web_development', order=0
+        )
+        self.mobile = MenuItem.objects.create(
+            menu=self.menu, title='Mobile', parent=self.services, named_url='mobile_apps', order=1
+        )
+        self.frontend = MenuItem.objects.create(
+            menu=self.menu, title='Frontend', parent=self.web, named_url='frontend_development', order=0
+        )
+        self.ios = MenuItem.objects.create(
+            menu=self.menu, title='iOS', parent=self.mobile, named_url='ios_development', order=0
+        )
+
+    def render(self, path, template_args=''):
+        from django.template import Context, Template
+
+        template = Template('{% load menu_tags %}{% draw_menu "options_menu" ' + template_args + ' %}')
+        return template.render(Context({'request': RequestFactory().get(path)}))
+
+    def test_max_depth(self):
+        """max_depth ограничивает количество отрисованных уровней."""
+        output = self.render(reverse('frontend_development'), 'max_depth=2')
+        self.assertIn('Web', output)
+        self.assertNotIn('Frontend', output)
+
+    def test_expand_all(self):
+        """expand_all отрисовывает все ветки, не меняя логику класса expanded."""
+        output = self.render(reverse('home'), 'expand_all=True')
+        self.assertIn('Frontend', output)
+        self.assertIn('iOS', output)
+        self.assertIn('<li class="has-children"><a href="/services/">', output)
+
+    def test_root(self):
+        """root отрисовывает только детей выбранного пункта."""
+        output = self.render(reverse('home'), 'root="mobile_apps"')
+        self.assertIn('iOS', output)
+        self.assertNotIn('Home', output)
+        self.assertNotIn('Web', output)
+        self.assertEqual(self.render(reverse('home'), 'root="missing"'), '')
+
+    def test_siblings_only(self):
+        """siblings_only отрисовывает только уровень активного пункта."""
+        deep = MenuItem.objects.create(
+            menu=self.menu, title='Deep', parent=self.frontend, explicit_url='/deep/', order=0
+        )
+        output = self.render(reverse('web_development'), 'siblings_only=True')
+        self.assertIn('Web', output)
+        self.assertIn('Mobile', output)
+        self.assertNotIn('Home', output)
+        self.assertNotIn('Frontend', output)
+        self.assertNotIn(deep.explicit_url, output)
+        self.assertNotIn('<ul><li', output)
+
+    def test_options_without_extra_queries(self):
+        """Все режимы отрисовываются из скомпилированного меню без запросов к БД."""
+        self.render(reverse('home'))
+        with self.assertNumQueries(0):
+            self.render(reverse('ios_development'), 'max_depth=1')
+            self.render(reverse('ios_development'), 'expand_all=True')
+            self.render(reverse('ios_development'), 'root=%d' % self.services.id)
+            self.render(reverse('ios_development'), 'siblings_only=True')
+
+
+class MenuStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = MenuStore()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu = Menu.objects.create(name='store_menu')
+            self.item = MenuItem.objects.create(menu=self.menu, title='Item', named_url='home')
+
+    def test_compiled_menu_is_reused(self):
+        """Повторное получение меню не обращается к БД."""
+        self.store.get('store_menu')
+        with self.assertNumQueries(0):
+            compiled = self.store.get('store_menu')
+        self.assertEqual(compiled.items, [self.item])
+        self.assertEqual(self.store.get_stats()['rebuilds'], 1)
+
+    def test_item_change_invalidates_menu(self):
+        """Изменение пункта меню приводит к перестроению."""
+        self.store.get('store_menu')
+        self.item.title = 'Renamed'
+        self.item.save()
+        compiled = self.store.get('store_menu')
+        self.assertEqual(compiled.items[0].title, 'Renamed')
+        self.assertEqual(self.store.get_stats()['rebuilds'], 2)
+
+    def test_nonexistent_menu(self):
+        """Несуществующее меню не кэшируется."""
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_stale_menu_served_during_rebuild(self):
+        """Пока другой поток перестраивает меню, отдается предыдущая версия."""
+        stale = self.store.get('store_menu')
+        bump_menu_version('store_menu')
+
+        with self.store._get_lock('store_menu'):
+            self.assertIs(self.store.get('store_menu'), stale)
+        self.assertEqual(self.store.get_stats()['stale_served'], 1)
+
+    def test_stale_menu_not_served_beyond_max_staleness(self):
+        """Устаревание отсчитывается от изменения меню, а не от первого запроса после него."""
+        stale = self.store.get('store_menu')
+        bump_menu_version('store_menu')
+        cache.set('menu:changed:store_menu', time.time() - 3600, timeout=None)
+
+        lock = self.store._get_lock('store_menu')
+        result = []
+        # Поток не видит данных тестовой транзакции, поэтому загрузка из БД подменяется
+        load = mock.patch.object(self.store, '_load_from_db', return_value=(self.menu, [self.item]))
+        with load, lock:
+            waiting = threading.Thread(target=lambda: result.append(self.store.get('store_menu')))
+            waiting.start()
+            waiting.join(0.2)
+            # Запрос ждет перестроения, а не получает версию часовой давности
+            self.assertTrue(waiting.is_alive())
+            lock.release()
+            waiting.join(5)
+            lock.acquire()
+
+        self.assertIsNot(result[0], stale)
+        self.assertEqual(self.store.get_stats()['stale_served'], 0)
+
+    def test_local_cache_compiled_ttl(self):
+        """С кэшем внутри процесса скомпилированное меню перечитывается по истечении времени жизни."""
+        from .cache import DEFAULT_LOCAL_COMPILED_TTL, get_compiled_ttl
+
+        self.assertEqual(get_compiled_ttl(), DEFAULT_LOCAL_COMPILED_TTL)
+        compiled = self.store.get('store_menu')
+        compiled.built_at -= DEFAULT_LOCAL_COMPILED_TTL + 1
+        self.assertIsNot(self.store.get('store_menu'), compiled)
+        self.assertEqual(self.store.get_stats()['rebuilds'], 2)
+
+        with override_settings(MENU_COMPILED_TTL=None):
+            compiled = self.store.get('store_menu')
+            compiled.built_at -= DEFAULT_LOCAL_COMPILED_TTL + 1
+            self.assertIs(self.store.get('store_menu'), compiled)
+
+    def test_concurrent_rebuilds_are_coalesced(self):
+        """Одновременные запросы без предыдущей версии выполняют одно перестроение."""
+        data = (self.menu, [self.item])
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_load(menu_name):
+            started.set()
+            release.wait(5)
+            return data
+
+        with mock.patch.object(self.store, '_load_from_db', side_effect=slow_load) as load:
+            first = threading.Thread(target=self.store.get, args=('store_menu',))
+            first.start()
+            started.wait(5)
+            second = threading.Thread(target=self.store.get, args=('store_menu',))
+            second.start()
+            # Даем второму потоку дойти до ожидания блокировки
+            time.sleep(0.1)
+            release.set()
+            first.join()
+            second.join()
+
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(self.store.get_stats()['coalesced'], 1)
+
+    @override_settings(MENU_CLUSTER_LOCK=True)
+    def test_cluster_rebuild_uses_shared_cache(self):
+        """Другой процесс берет меню из общего кэша без запросов к БД."""
+        self.store.get('store_menu')
+        other = MenuStore()
+        with self.assertNumQueries(0):
+            compiled = other.get('store_menu')
+        self.assertEqual(compiled.items, [self.item])
+        self.assertEqual(other.get_stats()['shared_hits'], 1)
+
+
+class MenuDeltaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = MenuStore()
+        # Изменения в одной транзакции публикуются вместе, поэтому меню создается
+        # в отдельной (для TestCase - с выполнением on_commit)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu = Menu.objects.create(name='delta_menu')
+            self.root = MenuItem.objects.create(menu=self.menu, title='Root', named_url='home', order=0)
+            self.other = MenuItem.objects.create(menu=self.menu, title='Other', named_url='contact', order=1)
+            self.child = MenuItem.objects.create(
+                menu=self.menu, title='Child', parent=self.root, named_url='about', order=0
+            )
+        self.compiled = self.store.get('delta_menu')
+
+    def render(self, path, **options):
+        renderer = MenuRenderer('delta_menu', path, **options)
+        with mock.patch('menu.templatetags.menu_tags.menu_store', self.store):
+            renderer.load_menu_data()
+        return renderer.render()
+
+    def test_title_change_is_patched_in_place(self):
+        """Изменение заголовка применяется без перестроения и запросов к БД."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child.title = 'Renamed'
+            self.child.save()
+
+        with self.assertNumQueries(0):
+            compiled = self.store.get('delta_menu')
+        self.assertIs(compiled, self.compiled)
+        self.assertEqual(compiled.items_by_id[self.child.id].title, 'Renamed')
+        self.assertEqual(self.store.get_stats()['rebuilds'], 1)
+        self.assertEqual(self.store.get_stats()['patched'], 1)
+
+    def test_add_move_and_remove(self):
+        """Добавление, перенос и удаление пунктов обновляют дерево детей."""
+        with self.captureOnCommitCallbacks(execute=True):
+            added = MenuItem.objects.create(menu=self.menu, title='Added', parent=self.other, order=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child.parent = self.other
+            self.child.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            added.delete()
+
+        compiled = self.store.get('delta_menu')
+        self.assertIs(compiled, self.compiled)
+        self.assertEqual(compiled.children[self.other.id], [self.child])
+        self.assertNotIn(self.root.id, compiled.children)
+        self.assertNotIn(added.id, compiled.items_by_id)
+
+    def test_only_affected_variants_are_invalidated(self):
+        """Изменение пункта в свернутой ветке не сбрасывает варианты, где он не отрисован."""
+        self.render(reverse('about'))
+        self.render(reverse('contact'))
+        self.assertEqual({key[0] for key in self.compiled.variants}, {self.child.id, self.other.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child.title = 'Renamed'
+            self.child.save()
+        self.store.get('delta_menu')
+
+        self.assertEqual({key[0] for key in self.compiled.variants}, {self.other.id})
+        self.assertIn('Renamed', self.render(reverse('about')))
+
+    def test_move_invalidates_variant_without_drawn_ancestors(self):
+        """Перенос неотрисованного предка активного пункта сбрасывает вариант с max_depth."""
+        from .cache import item_delta
+
+        parent = MenuItem.objects.create(menu=self.menu, title='P1', parent=self.root, explicit_url='/x/')
+        moved = MenuItem.objects.create(menu=self.menu, title='M', parent=parent, explicit_url='/x/m/')
+        MenuItem.objects.create(menu=self.menu, title='A', parent=moved, explicit_url='/x/m/a/')
+        new_parent = MenuItem.objects.create(menu=self.menu, title='P2', parent=self.other, explicit_url='/y/')
+        self.store.clear()
+        compiled = self.store.get('delta_menu')
+
+        html = self.render('/x/m/a/', max_depth=1)
+        self.assertIn('<li class="has-children expanded"><a href="/">Root</a>', html)
+
+        moved.parent = new_parent
+        self.assertTrue(compiled.apply_delta(item_delta(moved)))
+        self.assertEqual(compiled.variants, {})
+        html = self.render('/x/m/a/', max_depth=1)
+        self.assertIn('<li class="has-children"><a href="/">Root</a>', html)
+        self.assertIn('<li class="has-children expanded"><a href="/contact/">Other</a>', html)
+
+    def test_render_does_not_copy_items(self):
+        """Отрисовка не копирует список всех пунктов меню."""
+        from .cache import CompiledMenu
+
+        with mock.patch.object(CompiledMenu, 'items', new_callable=mock.PropertyMock) as items:
+            self.render(reverse('about'))
+            self.render(reverse('about'))
+        items.assert_not_called()
+
+    def test_variant_not_stored_after_concurrent_delta(self):
+        """Вариант, отрисованный по меню, измененному во время отрисовки, не сохраняется."""
+        from .cache import item_delta
+
+        renderer = MenuRenderer('delta_menu', reverse('about'))
+        with mock.patch('menu.templatetags.menu_tags.menu_store', self.store):
+            renderer.load_menu_data()
+
+        self.child.title = 'Renamed'
+        self.assertTrue(self.compiled.apply_delta(item_delta(self.child)))
+        renderer.render()
+        self.assertEqual(self.compiled.variants, {})
+
+    def test_bulk_change_is_published_once_without_delta(self):
+        """Изменение нескольких пунктов в транзакции публикуется одной версией без delta."""
+        from .cache import get_menu_version
+
+        version = get_menu_version('delta_menu')
+        with mock.patch('menu.signals.store_menu_delta') as store_delta:
+            with mock.patch('menu.cache.store_menu_delta') as store_bump_delta:
+                with self.captureOnCommitCallbacks(execute=True):
+                    MenuItem.objects.filter(menu=self.menu).delete()
+        store_delta.assert_not_called()
+        store_bump_delta.assert_not_called()
+        self.assertEqual(get_menu_version('delta_menu'), version + 2)
+
+        compiled = self.store.get('delta_menu')
+        self.assertEqual(compiled.items_by_id, {})
+        self.assertEqual(self.store.get_stats()['rebuilds'], 2)
+
+    def test_menu_delete_does_not_query_per_item(self):
+        """Каскадное удаление меню не выполняет запрос на каждый пункт и меняет версию один раз."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .cache import get_menu_version
+
+        MenuItem.objects.bulk_create([MenuItem(menu=self.menu, title=f'Bulk {n}') for n in range(50)])
+        version = get_menu_version('delta_menu')
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                Menu.objects.get(pk=self.menu.pk).delete()
+        self.assertLess(len(queries), 10)
+        self.assertEqual(get_menu_version('delta_menu'), version + 2)
+        self.assertIsNone(self.store.get('delta_menu'))
+
+    def test_missing_delta_falls_back_to_rebuild(self):
+        """Без изменения в кэше меню перестраивается целиком."""
+        self.child.title = 'Renamed'
+        self.child.save()
+
+        compiled = self.store.get('delta_menu')
+        self.assertIsNot(compiled, self.compiled)
+        self.assertEqual(compiled.items_by_id[self.child.id].title, 'Renamed')
+        self.assertEqual(self.store.get_stats()['rebuilds'], 2)
+
+    def test_rolled_back_change_is_not_published(self):
+        """Изменение из откаченной транзакции не попадает в скомпилированное меню."""
+        from django.db import transaction
+
+        try:
+            with transaction.atomic():
+                self.child.title = 'Rolled back'
+                self.child.save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        compiled = self.store.get('delta_menu')
+        self.assertEqual(compiled.items_by_id[self.child.id].title, 'Child')
+
+
+@override_settings(MENU_PAGE_CACHE_TIMEOUT=60)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu = Menu.objects.create(name='main_menu')
+            self.item = MenuItem.objects.create(menu=self.menu, title='Home', named_url='home')
+
+    def get(self, path):
+        from . import views
+
+        with mock.patch.object(views, 'render', wraps=views.render) as render:
+            response = self.client.get(path)
+        return response, render.call_count
+
+    def test_template_menus(self):
+        """Меню шаблона определяются с учетом extends."""
+        from .views import get_template_menus
+
+        self.assertEqual(get_template_menus('menu/about.html'), ('main_menu',))
+
+    def test_cache_hit_skips_rendering(self):
+        """Повторный запрос отдается из кэша без отрисовки шаблона."""
+        first, rendered = self.get(reverse('about'))
+        self.assertEqual(rendered, 1)
+        second, rendered = self.get(reverse('about'))
+        self.assertEqual(rendered, 0)
+        self.assertEqual(first.content, second.content)
+
+    def test_menu_change_invalidates_page(self):
+        """Изменение меню страницы сбрасывает ее кэш, изменение другого меню - нет."""
+        self.get(reverse('about'))
+
+        footer = Menu.objects.create(name='footer_menu')
+        MenuItem.objects.create(menu=footer, title='Footer')
+        _, rendered = self.get(reverse('about'))
+        self.assertEqual(rendered, 0)
+
+        self.item.title = 'Renamed'
+        self.item.save()
+        response, rendered = self.get(reverse('about'))
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Renamed')
+
+    def test_stale_menu_not_cached_under_new_version(self):
+        """Страница с устаревшим меню не сохраняется под новой версией меню."""
+        from .cache import menu_store
+
+        self.get(reverse('about'))
+        MenuItem.objects.filter(pk=self.item.pk).update(title='Renamed')
+        bump_menu_version('main_menu')
+
+        # Пока меню перестраивает другой поток, отдается устаревший вариант
+        lock = menu_store._get_lock('main_menu')
+        with lock:
+            response, rendered = self.get(reverse('about'))
+        self.assertEqual(rendered, 1)
+        self.assertNotContains(response, 'Renamed')
+
+        response, rendered = self.get(reverse('about'))
+        self.assertEqual(rendered, 1)
+        self.assertContains(response, 'Renamed')
+
+    @override_settings(MENU_PAGE_CACHE_TIMEOUT=None)
+    def test_cache_disabled(self):
+        """Без MENU_PAGE_CACHE_TIMEOUT страница отрисовывается каждый раз."""
+        self.get(reverse('about'))
+        _, rendered = self.get(reverse('about'))
+        self.assertEqual(rendered, 1)
+
+
+class LoadTestCommandTests(TestCase):
+    def test_loadtest_report(self):
+        """Команда loadtest_menu выводит JSON отчет с перцентилями и запросами к БД."""
+        out = StringIO()
+        call_command(
+            'loadtest_menu', '--requests', '6', '--workers', '2', '--warmup', '0',
+            '--host', 'testserver', '--paths', reverse('home'), reverse('about'),
+            stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['requests'], 6)
+        self.assertEqual(report['status_codes'], {'200': 6})
+        self.assertEqual(set(report['paths']), {reverse('home'), reverse('about')})
+        self.assertIn('p99', report['latency_ms'])
+        self.assertIn('mean', report['queries_per_request'])
+
+    def test_synthetic_menu(self):
+        """Синтетическое меню содержит заданное количество пунктов с собственными путями."""
+        from .synthetic import build_synthetic_menu
+
+        urls = build_synthetic_menu('synthetic_menu', 50, seed=1)
+        self.assertEqual(len(urls), 50)
+        self.assertEqual(len(set(urls)), 50)
+        self.assertEqual(MenuItem.objects.filter(menu__name='synthetic_menu').count(), 50)
+
+    @override_settings(ROOT_URLCONF='menu.loadtest_urls')
+    def test_synthetic_item_becomes_active(self):
+        """Страница синтетического пункта делает его активным и разворачивает его ветку."""
+        from .synthetic import build_synthetic_menu
+
+        urls = build_synthetic_menu('synthetic_menu', 50, seed=1)
+        item = MenuItem.objects.get(explicit_url=urls[-1])
+        response = self.client.get(item.explicit_url)
+        self.assertContains(response, f'<li class="active expanded"><a href="{item.explicit_url}">{item.title}</a>')
+        self.assertContains(response, item.parent.title)
+
+    def test_synthetic_requires_confirmation(self):
+        """Перед удалением существующих пунктов меню команда спрашивает подтверждение."""
+        menu = Menu.objects.create(name='main_menu')
+        MenuItem.objects.create(menu=menu, title='Home', named_url='home')
+
+        with mock.patch('builtins.input', return_value='n'):
+            with self.assertRaises(CommandError):
+                call_command(
+                    'loadtest_menu', '--synthetic', '20', '--menu', 'main_menu', stdout=StringIO()
+                )
+        self.assertEqual(MenuItem.objects.filter(menu=menu).count(), 1)
+
+
+class ProfileCommandTests(TestCase):
+    def test_profile_menu(self):
+        """profile_menu печатает этапы отрисовки, пишет pstats и сравнивает с базой."""
+        import os
+        import tempfile
+
+        menu = Menu.objects.create(name='profile_menu')
+        MenuItem.objects.create(menu=menu, title='Home', named_url='home')
+
+        with tempfile.TemporaryDirectory() as directory:
+            pstats_path = os.path.join(directory, 'menu.pstats')
+            baseline_path = os.path.join(directory, 'baseline.json')
+            args = ['profile_menu', 'profile_menu', reverse('home'), '--iterations', '3', '--pstats', pstats_path]
+
+            out = StringIO()
+            call_command(*args, '--save-baseline', baseline_path, stdout=out)
+            self.assertIn('render_menu_item', out.getvalue())
+            self.assertTrue(os.path.exists(pstats_path))
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.assertIn('get_url', baseline)
+            self.assertGreater(baseline['expand_ancestors']['calls_per_render'], 0)
+
+            out = StringIO()
+            call_command(*args, '--baseline', baseline_path, stdout=out)
+            self.assertIn('%', out.getvalue())
+
+    def test_profile_missing_menu(self):
+        """Для несуществующего меню команда завершается ошибкой."""
+        with self.assertRaises(CommandError):
+            call_command('profile_menu', 'missing', '/', stdout=StringIO())
@@ -1,15 +1,21 @@
 from django.urls import path
 from . import views
 
+# Страницы сайта: маршрут, имя URL (и шаблона menu/<имя>.html), заголовок
+PAGES = [
+    ('', 'home', 'Главная'),
+    ('about/', 'about', 'О нас'),
+    ('services/', 'services', 'Наши услуги'),
+    ('services/web-development/', 'web_development', 'Веб-разработка'),
+    ('services/web-development/frontend/', 'frontend_development', 'Фронтенд разработка'),
+    ('services/web-development/backend/', 'backend_development', 'Бэкенд разработка'),
+    ('services/mobile-apps/', 'mobile_apps', 'Мобильные приложения'),
+    ('services/mobile-apps/ios/', 'ios_development', 'iOS разработка'),
+    ('services/mobile-apps/android/', 'android_development', 'Android разработка'),
+    ('contact/', 'contact', 'Контакты'),
+]
+
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('about/', views.about, name='about'),
-    path('services/', views.services, name='services'),
-    path('services/web-development/', views.web_development, name='web_development'),
-    path('services/web-development/frontend/', views.frontend_development, name='frontend_development'),
-    path('services/web-development/backend/', views.backend_development, name='backend_development'),
-    path('services/mobile-apps/', views.mobile_apps, name='mobile_apps'),
-    path('services/mobile-apps/ios/', views.ios_development, name='ios_development'),
-    path('services/mobile-apps/android/', views.android_development, name='android_development'),
-    path('contact/', views.contact, name='contact'),
-]
\ No newline at end of file
+    path(route, views.page, {'template_name': f'menu/{name}.html', 'page_title': title}, name=name)
+    for route, name, title in PAGES
+]
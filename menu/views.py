@@ -1,51 +1,127 @@
-from django.shortcuts import render
-
-
-def home(request):
-    """Представление главной страницы."""
-    return render(request, 'menu/home.html', {'page_title': 'Главная'})
-
-
-def about(request):
-    """Представление страницы "О нас"."""
-    return render(request, 'menu/about.html', {'page_title': 'О нас'})
-
-
-def services(request):
-    """Представление страницы услуг."""
-    return render(request, 'menu/services.html', {'page_title': 'Наши услуги'})
-
-
-def web_development(request):
-    """Представление страницы веб-разработки."""
-    return render(request, 'menu/web_development.html', {'page_title': 'Веб-разработка'})
-
-
-def mobile_apps(request):
-    """Представление страницы мобильных приложений."""
-    return render(request, 'menu/mobile_apps.html', {'page_title': 'Мобильные приложения'})
+import functools
+import hashlib
 
-
-def contact(request):
-    """Представление страницы контактов."""
-    return render(request, 'menu/contact.html', {'page_title': 'Контакты'})
-
-
-def frontend_development(request):
-    """Представление страницы фронтенд разработки."""
-    return render(request, 'menu/frontend_development.html', {'page_title': 'Фронтенд разработка'})
-
-
-def backend_development(request):
-    """Представление страницы бэкенд разработки."""
-    return render(request, 'menu/backend_development.html', {'page_title': 'Бэкенд разработка'})
-
-
-def ios_development(request):
-    """Представление страницы iOS разработки."""
-    return render(request, 'menu/ios_development.html', {'page_title': 'iOS разработка'})
-
-
-def android_development(request):
-    """Представление страницы Android разработки."""
-    return render(request, 'menu/android_development.html', {'page_title': 'Android разработка'})
\ No newline at end of file
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.template.library import SimpleNode
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+from .cache import get_cache, get_menu_version, get_setting
+from .templatetags.menu_tags import draw_menu
+
+
+PAGE_KEY = 'menu:page:{digest}'
+
+
+def page(request, template_name, page_title):
+    """
+    Представление страницы сайта.
+    При заданном MENU_PAGE_CACHE_TIMEOUT страница кэшируется целиком по пути и версиям
+    всех меню, которые отрисовывает шаблон, поэтому изменение меню сбрасывает только
+    страницы с этим меню.
+    """
+    timeout = get_setting('PAGE_CACHE_TIMEOUT', None)
+    versions = None
+    if timeout and request.method in ('GET', 'HEAD'):
+        versions = get_page_menu_versions(template_name)
+
+    if versions is not None:
+        cached = get_cache().get(get_page_cache_key(request.path, template_name, versions))
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        # draw_menu записывает сюда версии меню, по которым оно отрисовано
+        request.menu_versions = {}
+
+    response = render(request, template_name, {'page_title': page_title})
+
+    if versions is not None and response.status_code == 200:
+        # Меню могло быть отдано устаревшим, пока его перестраивает другой поток,
+        # поэтому страница сохраняется под версиями, которые реально отрисованы
+        rendered = {
+            name: version for name, version in request.menu_versions.items()
+            if name in versions and version is not None
+        }
+        key = get_page_cache_key(request.path, template_name, dict(versions, **rendered))
+        get_cache().set(key, (response.content, response['Content-Type']), timeout)
+    return response
+
+
+def synthetic_page(request, menu_name, item_path):
+    """Страница пункта синтетического меню (маршрут из menu/loadtest_urls.py)."""
+    return render(request, 'menu/synthetic.html', {'page_title': item_path, 'menu_name': menu_name})
+
+
+def get_page_menu_versions(template_name):
+    """
+    Возвращает словарь {имя меню: версия} для меню шаблона или None, если меню
+    шаблона нельзя определить или версии меню недоступны.
+    """
+    menu_names = get_template_menus(template_name)
+    if menu_names is None:
+        return None
+
+    versions = {}
+    for menu_name in menu_names:
+        version = get_menu_version(menu_name)
+        if version is None:
+            return None
+        versions[menu_name] = version
+    return versions
+
+
+def get_page_cache_key(path, template_name, versions):
+    """Возвращает ключ кэша страницы для пути, шаблона и версий его меню."""
+    parts = [path, template_name]
+    parts.extend(f'{menu_name}={versions[menu_name]}' for menu_name in sorted(versions))
+    digest = hashlib.md5('\n'.join(parts).encode()).hexdigest()
+    return PAGE_KEY.format(digest=digest)
+
+
+@functools.lru_cache(maxsize=None)
+def get_template_menus(template_name):
+    """
+    Возвращает отсортированные имена меню, которые отрисовывает шаблон (с учетом
+    extends и include), или None, если имя меню или шаблона задано переменной.
+    """
+    menu_names = set()
+    if not _collect_template_menus(get_template(template_name).template, menu_names, set()):
+        return None
+    return tuple(sorted(menu_names))
+
+
+def _literal(expression):
+    """Возвращает строковую константу выражения шаблона или None."""
+    if isinstance(expression.var, str) and not expression.filters:
+        return expression.var
+    return None
+
+
+def _collect_template_menus(template, menu_names, seen):
+    if template.name in seen:
+        return True
+    seen.add(template.name)
+
+    for node in template.nodelist.get_nodes_by_type(SimpleNode):
+        if node.func is draw_menu:
+            menu_name = _literal(node.args[0]) if node.args else None
+            if menu_name is None:
+                return False
+            menu_names.add(menu_name)
+
+    for node in template.nodelist.get_nodes_by_type(ExtendsNode):
+        parent_name = _literal(node.parent_name)
+        if parent_name is None:
+            return False
+        if not _collect_template_menus(get_template(parent_name).template, menu_names, seen):
+            return False
+
+    for node in template.nodelist.get_nodes_by_type(IncludeNode):
+        included_name = _literal(node.template)
+        if included_name is None:
+            return False
+        if not _collect_template_menus(get_template(included_name).template, menu_names, seen):
+            return False
+
+    return True